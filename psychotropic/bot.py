@@ -1,7 +1,7 @@
 import logging
 import sys
 
-from aiohttp import ClientSession
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
 from discord import Activity, ActivityType, Intents, Interaction, Permissions
 from discord.app_commands import Command
 from discord.app_commands import locale_str as _
@@ -12,7 +12,7 @@ from discord.utils import oauth_url
 from psychotropic import settings
 from psychotropic.embeds import DefaultEmbed
 from psychotropic.i18n import localize, localize_fmt, set_locale, translator
-from psychotropic.providers import PROVIDERS
+from psychotropic.providers import PROVIDERS, psymol
 
 log = logging.getLogger(__name__)
 
@@ -79,7 +79,14 @@ class PsychotropicBot(Bot):
     async def setup_hook(self):
         log.info(f"OAuth URL: {self.oauth_url}")
 
-        self.http_session = ClientSession()
+        # Shared by all providers so connections to a given host are pooled and
+        # kept alive across commands instead of being re-established each time.
+        # The connect timeout is per socket: unlike `connect`, it does not count
+        # time spent waiting for a free slot when many requests are gathered.
+        self.http_session = ClientSession(
+            connector=TCPConnector(limit=50, limit_per_host=20),
+            timeout=ClientTimeout(total=30, sock_connect=10),
+        )
 
         await self.load_extensions()
         await self.tree.set_translator(translator)
@@ -89,6 +96,15 @@ class PsychotropicBot(Bot):
     async def on_ready(self):
         log.info(f"Logged in as {self.user.name} ({self.user.id}).")
 
+    async def close(self):
+        # Cogs tasks might still use the session and the pool while shutting down
+        await super().close()
+
+        if session := getattr(self, "http_session", None):
+            await session.close()
+
+        psymol.shutdown_pool()
+
 
 class InviteView(View):
     def __init__(self):
@@ -3,6 +3,7 @@ import logging
 from io import BytesIO
 from random import choice
 
+from aiohttp import ClientError
 from discord import ButtonStyle, File
 from discord.app_commands import command
 from discord.app_commands import locale_str as _
@@ -141,6 +142,8 @@ class RunningReagentsGame(BaseRunningGame):
         if not self:
             return
 
+        self.session = interaction.client.http_session
+
         embed = (
             DefaultEmbed(
                 title=(
@@ -289,7 +292,17 @@ class RunningReagentsGame(BaseRunningGame):
         """Return a Discord view used to decorate end game embeds."""
         view = ReplayView(callback=self.replay)
 
-        substance = await pnwiki.get_substance(self.game.substance["commonName"])
+        substance = None
+
+        try:
+            # Short timeout because a response is needed in less than 3 seconds
+            # when triggered by the game end application command
+            substance = await pnwiki.get_substance(
+                self.session, self.game.substance["commonName"], timeout=2,
+            )
+        except (ClientError, aio.TimeoutError):
+            log.warning("Unable to reach PsychonautWiki API")
+
         # The substance might not be found on PNW
         if substance:
             view.add_item(
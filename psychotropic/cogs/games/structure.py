@@ -1,7 +1,6 @@
 import asyncio as aio
 import logging
 import re
-from concurrent.futures import ThreadPoolExecutor
 from secrets import choice
 
 from discord import ButtonStyle, File
@@ -114,26 +113,32 @@ class SchematicRegistry:
 
             # 2a. Fetch molfiles from isomerdesign
             # (by URL if available, otherwise search by name)
+            sources = {}
+            for name, row in psymol_substances.items():
+                mol_path = self.MOLFILES_DIR / f"{name}.mol"
+                if mol_path.exists():
+                    log.info(
+                        f"[molfile] Skipped {name} "
+                        "(cached)"
+                    )
+                else:
+                    sources[name] = row.get('url', '') or name
+
             async with httpx.AsyncClient(
+                http2=True,
                 headers={"User-Agent": "Mozilla/5.0"},
                 timeout=10,
+                limits=httpx.Limits(max_connections=20),
             ) as client:
-                for name, row in psymol_substances.items():
-                    mol_path = self.MOLFILES_DIR / f"{name}.mol"
-                    if mol_path.exists():
-                        log.info(
-                            f"[molfile] Skipped {name} "
-                            "(cached)"
-                        )
-                        continue
-
-                    url = row.get('url', '')
-                    source = url or name
-                    molblock = await psymol.fetch_molfile(
-                        source, client=client
-                    )
+                # Write each molfile as soon as it is fetched, so the ones
+                # already downloaded are kept if the startup is interrupted
+                async for name, molblock in psymol.fetch_molfiles(
+                    sources.items(), client=client
+                ):
                     if molblock:
-                        mol_path.write_text(molblock)
+                        (self.MOLFILES_DIR / f"{name}.mol").write_text(
+                            molblock
+                        )
                         log.info(
                             f"[molfile] Fetched {name}"
                         )
@@ -194,13 +199,13 @@ class SchematicRegistry:
                     smiles, image_path, mol_path
                 )
 
-            def _generate(name, smiles, path, mol_path):
+            async def _generate(name, smiles, path, mol_path):
                 image = None
 
                 # Prefer molfile coordinates
                 if mol_path.exists():
                     molblock = mol_path.read_text()
-                    image = psymol.generate_from_molfile(
+                    image = await psymol.generate_from_molfile(
                         molblock
                     )
                     if image:
@@ -211,8 +216,9 @@ class SchematicRegistry:
 
                 # Fall back to SMILES + CoordGen
                 if not image and smiles:
-                    image = psymol.generate_schematic_image(
-                        smiles
+                    # Already deduplicated and cached on disk
+                    image = await psymol.generate_schematic_image(
+                        smiles, use_cache=False
                     )
                     if image:
                         log.info(
@@ -221,22 +227,17 @@ class SchematicRegistry:
                         )
 
                 if image:
-                    image.save(path)
+                    await aio.to_thread(image.save, path)
                 else:
                     log.warning(
                         f"[psymol] Failed to generate {name}"
                     )
 
-            loop = aio.get_running_loop()
-            with ThreadPoolExecutor(max_workers=8) as pool:
-                await aio.gather(*(
-                    loop.run_in_executor(
-                        pool, _generate, name,
-                        smiles, path, mol_path
-                    )
-                    for name, (smiles, path, mol_path)
-                    in to_generate.items()
-                ))
+            await aio.gather(*(
+                _generate(name, smiles, path, mol_path)
+                for name, (smiles, path, mol_path)
+                in to_generate.items()
+            ))
 
         self.schematics = list(self.path.glob("*.png"))
 
@@ -464,7 +465,7 @@ class RunningStructureGame(BaseRunningGame):
             substance = await pnwiki.get_substance(
                 self.session, self.game.substance, timeout=2,
             )
-        except ClientError:
+        except (ClientError, aio.TimeoutError):
             log.warning("Unable to reach PsychonautWiki API")
 
         # The PNW API does fuzzy matching, so verify the name matches
@@ -1,8 +1,10 @@
 import asyncio as aio
 from io import BytesIO
+from itertools import chain
 from operator import itemgetter
 from urllib.parse import quote
 
+import orjson
 from aiohttp import ClientError, ClientSession, ClientTimeout
 from PIL import Image
 
@@ -30,7 +32,8 @@ async def list_substances(session: ClientSession):
     async with session.post(
         PNWIKI_API_URL, json={'query': query}, headers=GRAPHQL_HEADERS,
     ) as r:
-        data = await r.json()
+        r.raise_for_status()
+        data = await r.json(loads=orjson.loads)
 
     return list(map(
         itemgetter('name'),
@@ -59,13 +62,54 @@ async def get_substance(session: ClientSession, query, **kwargs):
         PNWIKI_API_URL, json={'query': query}, headers=GRAPHQL_HEADERS,
         **kwargs,
     ) as r:
-        data = await r.json()
+        r.raise_for_status()
+        data = await r.json(loads=orjson.loads)
 
     substances = data["data"]["substances"]
 
     return substances[0] if len(substances) else None
 
 
+async def get_substances_bulk(session: ClientSession, queries, chunk_size=25):
+    """Batch version of `get_substance`, packing up to `chunk_size` lookups
+    in each GraphQL request using field aliases.
+
+    Returns a dict mapping each query to its substance, or None if no
+    substance was found.
+    """
+    async def _fetch_chunk(chunk):
+        aliases = [f"q{i}" for i in range(len(chunk))]
+        query = "query (%s) { %s }" % (
+            ", ".join(f"${alias}: String" for alias in aliases),
+            " ".join(
+                f"{alias}: substances(query: ${alias}, limit: 1) {{"
+                " name url class { chemical psychoactive } }"
+                for alias in aliases
+            ),
+        )
+
+        async with session.post(PNWIKI_API_URL, json={
+            'query': query,
+            'variables': dict(zip(aliases, chunk)),
+        }, headers=GRAPHQL_HEADERS) as r:
+            r.raise_for_status()
+            data = await r.json(loads=orjson.loads)
+
+        return [
+            substances[0] if (substances := data["data"][alias]) else None
+            for alias in aliases
+        ]
+
+    queries = list(queries)
+    chunks = [
+        queries[i:i + chunk_size]
+        for i in range(0, len(queries), chunk_size)
+    ]
+    results = await aio.gather(*map(_fetch_chunk, chunks))
+
+    return dict(zip(queries, chain.from_iterable(results)))
+
+
 async def get_page_images(session: ClientSession, substance_names):
     """Batch-query the MediaWiki API to get the primary image filename
     for each substance page.
@@ -73,21 +117,25 @@ async def get_page_images(session: ClientSession, substance_names):
     Returns a dict mapping substance name to its SVG filename, or None
     if no page image was found.
     """
-    result = {}
-
-    # MediaWiki API supports up to 50 titles per request
-    for i in range(0, len(substance_names), 50):
-        batch = substance_names[i:i + 50]
-        titles = "|".join(batch)
-
+    async def _fetch_batch(batch):
         async with session.get(PNWIKI_MW_API_URL, params={
             "action": "query",
-            "titles": titles,
+            "titles": "|".join(batch),
             "prop": "pageimages",
             "format": "json",
         }) as r:
-            data = await r.json()
+            r.raise_for_status()
+            return await r.json(loads=orjson.loads)
+
+    # MediaWiki API supports up to 50 titles per request
+    batches = [
+        substance_names[i:i + 50]
+        for i in range(0, len(substance_names), 50)
+    ]
+    responses = await aio.gather(*map(_fetch_batch, batches))
 
+    result = {}
+    for data in responses:
         pages = data.get("query", {}).get("pages", {})
         for page in pages.values():
             title = page.get("title")
@@ -105,16 +153,28 @@ def get_schematic_url(filename, width=500):
     )
 
 
-def _parse_schematic_image(data, background_color=None):
-    """Parse raw image bytes into a PIL Image with optional background."""
+def _parse_schematic_image(data, background_color=None, width=None):
+    """Parse raw image bytes into a PIL Image with optional background.
+
+    If `width` is given, formats supporting it (eg. JPEG) are decoded at a
+    reduced scale that still covers this width."""
     image = Image.open(BytesIO(data))
+    if width:
+        image.draft(None, (width, max(1, image.height * width // image.width)))
+    image.load()
+
+    if not background_color:
+        return image
+
+    # Palette or grayscale transparency is only usable as a mask once
+    # expanded to an alpha channel
+    if image.mode in ("P", "LA") or "transparency" in image.info:
+        image = image.convert("RGBA")
 
-    if background_color:
-        background = Image.new("RGB", image.size, background_color)
-        background.paste(image, mask=image)
-        image = background
+    background = Image.new("RGB", image.size, background_color)
+    background.paste(image, mask=image if image.mode == "RGBA" else None)
 
-    return image
+    return background
 
 
 async def get_schematic_image(
@@ -128,7 +188,7 @@ async def get_schematic_image(
             return None
         data = await r.read()
 
-    return _parse_schematic_image(data, background_color)
+    return _parse_schematic_image(data, background_color, width)
 
 
 async def fetch_schematic_images(
@@ -152,7 +212,9 @@ async def fetch_schematic_images(
                     data = await r.read()
             except ClientError:
                 return name, None
-            return name, _parse_schematic_image(data, background_color)
+            return name, _parse_schematic_image(
+                data, background_color, width
+            )
 
     pairs = await aio.gather(*(
         _fetch_one(name, filename)
@@ -1,41 +1,88 @@
+import asyncio as aio
 import csv
 import json
+import multiprocessing
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import cache
 from importlib import resources
 from io import BytesIO, StringIO
 
+from cachetools import LRUCache
 import httpx
-from PIL import Image, ImageChops
+import numpy as np
+import orjson
+from PIL import Image, ImageColor
 from rdkit import Chem
-from rdkit.Chem import rdCoordGen, rdDepictor
+from rdkit.Chem import rdCoordGen, rdDepictor, rdMolTransforms
 from rdkit.Chem.Draw import rdMolDraw2D
 
-# Render on an oversized canvas, then auto-crop to fit the molecule.
-_RENDER_SIZE = 2000
+from psychotropic import settings
+
+# Render on a canvas oversampled relative to the target width, then auto-crop
+# to fit the molecule. Bond lengths are absolute, so the canvas size only caps
+# how large a molecule can be drawn before RDKit shrinks it to fit.
 _PADDING = 12
 _TARGET_WIDTH = 600
+_OVERSAMPLE = 2
+_RENDER_SIZE = _TARGET_WIDTH * _OVERSAMPLE
+_SMALL_MOL_ATOMS = 14
+
+# Homogeneous transform rotating 2D coordinates by 180° around the Z axis
+_ROTATE_180 = np.diag([-1.0, -1.0, 1.0, 1.0])
+
+_ID_QUERY_RE = re.compile(r'isomerdesign\.com.*?id=(\d+)')
+_ID_PATH_RE = re.compile(r'isomerdesign\.com/pihkal/explore/(\d+)')
+_BOLD_TAG_RE = re.compile(r'</?b>')
+_JSONLD_RE = re.compile(
+    r'<script type="application/ld\+json">(.*?)</script>', re.DOTALL
+)
+
+# Rendering is CPU-bound and holds the GIL for most of its duration, so it is
+# offloaded to worker processes. The pool is created on first use.
+_pool = None
 
+# Schematics rendered from SMILES, stored as PNG bytes keyed by canonical
+# SMILES and background color. The cache size is a budget in bytes.
+_schematic_cache = LRUCache(
+    maxsize=settings.SCHEMATIC_CACHE_SIZE, getsizeof=len
+)
 
+
+@cache
 def load_substances():
     """Load all substances from the bundled psymol CSV.
 
     Returns a dict mapping substance name to its row dict (url, smiles, etc.).
+    The CSV is only parsed once, and the same dict is returned on subsequent
+    calls: it must not be mutated.
     """
     text = resources.read_text('psychotropic.data', 'psymol.csv')
     reader = csv.DictReader(StringIO(text))
     return {row['name']: row for row in reader}
 
 
+def _new_client():
+    """Build the client used when callers do not provide one. With HTTP/2,
+    lookups and page fetches share a single connection to isomerdesign."""
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    )
+
+
 def extract_isomerdesign_id(url):
     """Extract the numeric ID from an isomerdesign URL.
 
     Returns the ID as a string, or None if not an isomerdesign URL.
     """
-    match = re.search(r'isomerdesign\.com.*?id=(\d+)', url)
+    match = _ID_QUERY_RE.search(url)
     if match:
         return match.group(1)
 
-    match = re.search(r'isomerdesign\.com/pihkal/explore/(\d+)', url)
+    match = _ID_PATH_RE.search(url)
     if match:
         return match.group(1)
 
@@ -55,39 +102,55 @@ async def search_substance(name, client=None):
         )
         if r.status_code != 200:
             return None
-        for entry in r.json():
+        for entry in orjson.loads(r.content):
             # Strip HTML bold tags for comparison
-            clean = re.sub(r'</?b>', '', entry.get("name", ""))
+            clean = _BOLD_TAG_RE.sub('', entry.get("name", ""))
             if clean.lower() == name.lower():
                 return entry["substance_id"]
         return None
 
     if client:
         return await _search(client)
-    async with httpx.AsyncClient() as c:
+    async with _new_client() as c:
         return await _search(c)
 
 
 async def _fetch_molfile_by_id(substance_id, client):
     """Fetch a molfile from an isomerdesign explore page by ID."""
-    r = await client.get(
+    match = None
+
+    # Stream the page and stop downloading once the JSON-LD block is received
+    async with client.stream(
+        "GET",
         f"https://isomerdesign.com/pihkal/explore/"
         f"{substance_id}",
         follow_redirects=True,
-    )
-    if r.status_code != 200:
-        return None
+    ) as r:
+        if r.status_code != 200:
+            return None
+
+        page = bytearray()
+        async for chunk in r.aiter_bytes():
+            page += chunk
+            start = page.find(b'application/ld+json')
+            if start == -1 or page.find(b'</script>', start) == -1:
+                continue
+
+            match = _JSONLD_RE.search(
+                page.decode(r.encoding or 'utf-8', 'ignore')
+            )
+            if match:
+                break
 
-    match = re.search(
-        r'<script type="application/ld\+json">(.*?)</script>',
-        r.text,
-        re.DOTALL,
-    )
     if not match:
         return None
 
     try:
-        data = json.loads(match.group(1), strict=False)
+        try:
+            data = orjson.loads(match.group(1))
+        except orjson.JSONDecodeError:
+            # Some pages embed raw control characters in strings
+            data = json.loads(match.group(1), strict=False)
         rep = data.get('hasRepresentation', {})
         if rep.get('name') == 'molfile':
             return rep['value']
@@ -120,13 +183,54 @@ async def fetch_molfile(url_or_name, client=None):
 
     if client:
         return await _fetch(client)
-    async with httpx.AsyncClient() as c:
+    async with _new_client() as c:
         return await _fetch(c)
 
 
+async def fetch_molfiles(sources, client=None, concurrency=10):
+    """Fetch many molfiles from isomerdesign concurrently, with at most
+    `concurrency` lookups in flight.
+
+    `sources` is an iterable of `(key, url_or_name)` pairs, keys being any
+    caller-defined identifier. Asynchronously yields `(key, molfile)` tuples as
+    soon as each fetch completes, `molfile` being None on failure.
+    """
+    semaphore = aio.Semaphore(concurrency)
+
+    async def _fetch_one(c, key, url_or_name):
+        async with semaphore:
+            try:
+                molfile = await fetch_molfile(url_or_name, client=c)
+            except (httpx.HTTPError, ValueError):
+                # A single unreachable page or malformed lookup response
+                # must not abort the whole batch
+                molfile = None
+            return key, molfile
+
+    async with nullcontext(client) if client else _new_client() as c:
+        tasks = [
+            aio.ensure_future(_fetch_one(c, key, url_or_name))
+            for key, url_or_name in sources
+        ]
+        try:
+            for task in aio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
 def _render_mol(mol, background_color):
     """Render an RDKit mol object to a tight-fit PIL Image."""
-    drawer = rdMolDraw2D.MolDraw2DCairo(_RENDER_SIZE, _RENDER_SIZE)
+    background = ImageColor.getrgb(background_color)
+
+    # Molecules of at most 14 atoms span at most 13 bonds, even as a straight
+    # chain, so they fit at full bond length on a canvas of the target width
+    # and there is no need to rasterize and scan the full oversampled canvas
+    size = _RENDER_SIZE
+    if mol.GetNumAtoms() <= _SMALL_MOL_ATOMS:
+        size = _TARGET_WIDTH
+    drawer = rdMolDraw2D.MolDraw2DCairo(size, size)
 
     opts = drawer.drawOptions()
     opts.bondLineWidth = 3.5
@@ -138,30 +242,35 @@ def _render_mol(mol, background_color):
     opts.additionalAtomLabelPadding = 0.15
     opts.padding = 0.01
     opts.useCDKAtomPalette()
+    opts.setBackgroundColour(tuple(c / 255 for c in background) + (1,))
 
     drawer.DrawMolecule(mol)
     drawer.FinishDrawing()
 
+    # Cairo outputs RGBA, but the background is opaque: only the cropped
+    # area needs an RGB conversion, and alpha can be ignored when cropping
     canvas = Image.open(BytesIO(drawer.GetDrawingText()))
-    canvas = canvas.convert("RGB")
 
-    # Auto-crop to molecule bounding box
-    bg = Image.new("RGB", canvas.size, background_color)
-    diff = ImageChops.difference(canvas, bg)
-    bbox = diff.getbbox()
-    if not bbox:
+    # Auto-crop to the bounding box of non-background pixels
+    pixels = np.asarray(canvas)[..., :3]
+    drawn = (pixels != background).any(axis=2)
+    rows = np.flatnonzero(drawn.any(axis=1))
+    cols = np.flatnonzero(drawn.any(axis=0))
+    if not rows.size:
         return None
 
-    cropped = canvas.crop(bbox)
+    cropped = canvas.crop(
+        (cols[0], rows[0], cols[-1] + 1, rows[-1] + 1)
+    ).convert("RGB")
 
     # Scale to target width, preserving aspect ratio
     cw, ch = cropped.size
-    scale = _TARGET_WIDTH / cw
     new_w = _TARGET_WIDTH
-    new_h = int(ch * scale)
-    cropped = cropped.resize(
-        (new_w, new_h), Image.LANCZOS
-    )
+    new_h = int(ch * _TARGET_WIDTH / cw)
+    if cw != _TARGET_WIDTH:
+        cropped = cropped.resize(
+            (new_w, new_h), Image.LANCZOS
+        )
 
     # Add padding
     result = Image.new(
@@ -174,7 +283,49 @@ def _render_mol(mol, background_color):
     return result
 
 
-def generate_from_molfile(molblock, background_color="WHITE"):
+def _get_pool():
+    global _pool
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=min(settings.RENDER_WORKERS, os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return _pool
+
+
+def shutdown_pool():
+    """Shut down the rendering worker processes, if they were started."""
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _run_in_pool(function, *args):
+    loop = aio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), function, *args)
+
+
+def _to_png(image):
+    """Encode a PIL Image to PNG bytes, which are much cheaper than a pickled
+    Image to send back from worker processes."""
+    if image is None:
+        return None
+
+    buffer = BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _from_png(data):
+    """Decode PNG bytes returned by a worker process to a PIL Image."""
+    return Image.open(BytesIO(data)) if data is not None else None
+
+
+def _generate_from_molfile_sync(molblock, background_color="WHITE"):
     """Generate a molecule image from a molfile block.
 
     Uses the pre-computed 2D coordinates from the molfile.
@@ -187,7 +338,7 @@ def generate_from_molfile(molblock, background_color="WHITE"):
     return _render_mol(mol, background_color)
 
 
-def generate_schematic_image(smiles, background_color="WHITE"):
+def _generate_schematic_image_sync(smiles, background_color="WHITE"):
     """Generate a molecule image from a SMILES string.
 
     Returns a PIL Image (RGB) or None if the SMILES is invalid.
@@ -200,11 +351,58 @@ def generate_schematic_image(smiles, background_color="WHITE"):
     # flip to match PubChem orientation, then straighten
     rdCoordGen.AddCoords(mol)
 
-    conf = mol.GetConformer()
-    for i in range(mol.GetNumAtoms()):
-        pos = conf.GetAtomPosition(i)
-        conf.SetAtomPosition(i, (-pos.x, -pos.y, pos.z))
+    rdMolTransforms.TransformConformer(mol.GetConformer(), _ROTATE_180)
 
     rdDepictor.StraightenDepiction(mol)
 
     return _render_mol(mol, background_color)
+
+
+def _generate_from_molfile_png(molblock, background_color):
+    """Same as `_generate_from_molfile_sync`, but return PNG bytes."""
+    return _to_png(_generate_from_molfile_sync(molblock, background_color))
+
+
+async def generate_from_molfile(molblock, background_color="WHITE"):
+    """Asynchronous version of `_generate_from_molfile_sync`, rendering in a
+    worker process so the event loop is not blocked."""
+    return _from_png(await _run_in_pool(
+        _generate_from_molfile_png, molblock, background_color
+    ))
+
+
+def _generate_schematic_png(smiles, background_color):
+    """Same as `_generate_schematic_image_sync`, but return PNG bytes."""
+    return _to_png(_generate_schematic_image_sync(smiles, background_color))
+
+
+async def generate_schematic_image(
+    smiles, background_color="WHITE", use_cache=True,
+):
+    """Asynchronous version of `_generate_schematic_image_sync`, rendering in
+    a worker process so the event loop is not blocked.
+
+    With `use_cache`, results are cached by canonical SMILES so equivalent
+    SMILES are only rendered once. This benefits callers rendering the same
+    substances repeatedly; batch callers which already deduplicate and persist
+    their results should disable it."""
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        return None
+
+    if not use_cache:
+        return _from_png(await _run_in_pool(
+            _generate_schematic_png, smiles, background_color
+        ))
+
+    key = (Chem.MolToSmiles(mol), background_color)
+
+    if key not in _schematic_cache:
+        data = await _run_in_pool(
+            _generate_schematic_png, smiles, background_color
+        )
+        if data is None:
+            return None
+        _schematic_cache[key] = data
+
+    return _from_png(_schematic_cache[key])
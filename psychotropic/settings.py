@@ -27,6 +27,10 @@ PREFIX = ">"
 
 HTTP_COOLDOWN = 0.2  # Delay between HTTP requests in seconds
 
+RENDER_WORKERS = 8  # Max number of processes rendering molecule schematics
+
+SCHEMATIC_CACHE_SIZE = 4 * 2**20  # In-memory cache of rendered schematics, in bytes
+
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 
 TEST_GUILD = Object(id=353885439331008512)